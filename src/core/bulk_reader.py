@@ -0,0 +1,59 @@
+import ctypes
+import fcntl
+
+from .spi_controller import _CMD_FAST_READ, _HDR_STRUCT
+
+
+class _SpiIocTransfer(ctypes.Structure):
+    """struct spi_ioc_transfer from linux/spi/spidev.h"""
+    _fields_ = [
+        ('tx_buf', ctypes.c_uint64),
+        ('rx_buf', ctypes.c_uint64),
+        ('len', ctypes.c_uint32),
+        ('speed_hz', ctypes.c_uint32), # 0 = use the device's max_speed_hz
+        ('delay_usecs', ctypes.c_uint16),
+        ('bits_per_word', ctypes.c_uint8), # 0 = use the device setting
+        ('cs_change', ctypes.c_uint8),
+        ('tx_nbits', ctypes.c_uint8),
+        ('rx_nbits', ctypes.c_uint8),
+        ('word_delay_usecs', ctypes.c_uint8),
+        ('pad', ctypes.c_uint8),
+    ]
+
+
+def _spi_ioc_message(n: int) -> int:
+    """SPI_IOC_MESSAGE(n) ioctl number: _IOW('k', 0, char[n * sizeof(spi_ioc_transfer)])"""
+    size = n * ctypes.sizeof(_SpiIocTransfer)
+    return (1 << 30) | (size << 16) | (ord('k') << 8) | 0
+
+
+class BulkReader:
+    """
+    Fast reads issued straight on the spidev file descriptor.
+    py-spidev turns every byte into a Python int on the way in and out, this skips all of that:
+    one ioctl per chunk carrying two transfers, the 5 byte header out and the data clocked
+    straight into the caller's buffer, with CS held low across both.
+    Not thread safe, calls must be serialized (SPIController runs them on its single I/O thread).
+    """
+
+    def __init__(self, fd: int, max_length: int):
+        self.fd = fd # Updated by the controller if the device gets reopened
+        self._max_length = max_length
+        self._header = ctypes.create_string_buffer(5)
+        # cs_change=0 on both: keep CS asserted between header and data, release it at the end
+        self._xfers = (_SpiIocTransfer * 2)()
+        self._xfers[0].tx_buf = ctypes.addressof(self._header)
+        self._xfers[0].len = 5
+        self._request = _spi_ioc_message(2)
+
+    def read(self, address: int, out: memoryview) -> None:
+        """Fast read len(out) bytes at address into out, raises OSError if the transfer fails"""
+        length = len(out)
+        if length > self._max_length:
+            raise ValueError(f"Read of {length} bytes exceeds buffer size {self._max_length}")
+        _HDR_STRUCT.pack_into(self._header, 0, _CMD_FAST_READ, (address & 0xFFFFFF) << 8)
+        # Data phase has no tx buffer, the controller clocks out filler while the flash answers
+        rx = (ctypes.c_char * length).from_buffer(out)
+        self._xfers[1].rx_buf = ctypes.addressof(rx)
+        self._xfers[1].len = length
+        fcntl.ioctl(self.fd, self._request, self._xfers)
@@ -1,10 +1,75 @@
 from loguru import logger
 import time
-from typing import Tuple, Optional, Union, List
+from typing import TYPE_CHECKING, Final, Tuple, Optional, Union, List
 import asyncio
-from dataclasses import dataclass
+import concurrent.futures
+import errno
+import functools
+import hashlib
+import random
+import struct
+import zlib
+from dataclasses import dataclass, field
+from types import MappingProxyType
 
-@dataclass # Convenience! Auto generates init, repr, etc for us. So clean
+if TYPE_CHECKING:
+    import spidev # Types for editors only, the real import waits for connect()
+
+try:
+    import google_crc32c # CRC32C on the SSE 4.2 / ARMv8 CRC instructions
+except ImportError:
+    google_crc32c = None # Optional, reads just come back without CRCs
+
+# Fingerprint for cross-checking re-reads, CRC32C when we have it
+_chunk_crc = google_crc32c.value if google_crc32c else zlib.crc32
+
+# SPI Flash Commands (Standard JEDEC), module level so hot paths do a global lookup
+_CMD_WRITE_ENABLE: Final[int] = 0x06
+_CMD_WRITE_DISABLE: Final[int] = 0x04
+_CMD_READ_ID: Final[int] = 0x9F
+_CMD_READ_STATUS: Final[int] = 0x05
+_CMD_WRITE_STATUS: Final[int] = 0x01
+_CMD_READ_DATA: Final[int] = 0x03
+_CMD_FAST_READ: Final[int] = 0x0B
+_CMD_PAGE_PROGRAM: Final[int] = 0x02
+_CMD_SECTOR_ERASE: Final[int] = 0x20
+_CMD_CHIP_ERASE: Final[int] = 0xC7
+
+# Status Register Bits
+_STATUS_WIP: Final[int] = 0x01  # Write In Progress
+_STATUS_WEL: Final[int] = 0x02  # Write Enable Latch
+
+# py-spidev refuses xfer2 lists longer than this (SPIDEV_MAXPATH), whatever the kernel bufsiz
+_SPIDEV_MAX_XFER: Final[int] = 4096
+
+# Granularity of ReadResult.sector_crcs, fixed so dumps from any host line up
+_CRC_SECTOR: Final[int] = 4096
+
+# Fast read header: opcode, then the 24 bit address shifted up so the dummy byte lands as 0
+_HDR_STRUCT: Final = struct.Struct('>BI')
+
+# Known chips keyed by raw JEDEC ID bytes: (size_mb, page_size, sector_size) (will expandd)
+_CHIP_TABLE = MappingProxyType({
+    b'\xef\x40\x16': (2, 256, 4096),    # W25Q16 (2MB)
+    b'\xef\x40\x17': (4, 256, 4096),    # W25Q32 (4MB)
+    b'\xef\x40\x18': (8, 256, 4096),    # W25Q64 (8MB)
+    b'\xef\x40\x19': (16, 256, 4096),   # W25Q128 (16MB)
+})
+
+@dataclass(slots=True, eq=False) # Holds a mutable buffer, so compare and hash by identity
+class ReadResult:
+    """Firmware read back from the chip plus its integrity digest"""
+    data: bytearray = field(repr=False) # Don't dump whole images into logs
+    sha256: bytes # SHA-256 of data, computed as the chunks arrived
+    crc32c: Optional[int] = None # CRC32C of data, None without google-crc32c
+    sector_crcs: dict = field(default_factory=dict, repr=False) # 4 KiB sector address -> CRC32C, to diff dumps
+
+    def __str__(self) -> str:
+        crc = f", CRC32C: 0x{self.crc32c:08X}" if self.crc32c is not None else ""
+        return f"{len(self.data)} bytes, SHA-256: {self.sha256.hex()}{crc}"
+
+
+@dataclass(slots=True, frozen=True) # Convenience! Auto generates init, repr, etc for us. So clean
 class ChipInfo:
     """Store detected chip information"""
     manufacturer_id: int
@@ -17,10 +82,10 @@ class ChipInfo:
          # The __str__ method to provide readable chip info
         return (f"Flash Chip: Manufacturer ID: 0x{self.manufacturer_id:02X}, "
                 f"Device ID: 0x{self.device_id:04X}, Size: {self.size_mb}MB")
-    
 
-    class SPIController:
-        """
+
+class SPIController:
+    """
     Advanced SPI Flash Controller
     Handles high speed communication with SPI flash chips via CH341A programmer.
     
@@ -29,23 +94,23 @@ class ChipInfo:
     High speed read operations with integrity checks
     Intelligent error handling and recovery
     Real time progress monitoring
-        """
+    """
     
-    # SPI Flash Commands (Standard JEDEC)
-    CMD_WRITE_ENABLE = 0x06
-    CMD_WRITE_DISABLE = 0x04
-    CMD_READ_ID = 0x9F
-    CMD_READ_STATUS = 0x05
-    CMD_WRITE_STATUS = 0x01
-    CMD_READ_DATA = 0x03
-    CMD_FAST_READ = 0x0B
-    CMD_PAGE_PROGRAM = 0x02
-    CMD_SECTOR_ERASE = 0x20
-    CMD_CHIP_ERASE = 0xC7
+    # SPI Flash Commands (Standard JEDEC), aliases of the module constants
+    CMD_WRITE_ENABLE = _CMD_WRITE_ENABLE
+    CMD_WRITE_DISABLE = _CMD_WRITE_DISABLE
+    CMD_READ_ID = _CMD_READ_ID
+    CMD_READ_STATUS = _CMD_READ_STATUS
+    CMD_WRITE_STATUS = _CMD_WRITE_STATUS
+    CMD_READ_DATA = _CMD_READ_DATA
+    CMD_FAST_READ = _CMD_FAST_READ
+    CMD_PAGE_PROGRAM = _CMD_PAGE_PROGRAM
+    CMD_SECTOR_ERASE = _CMD_SECTOR_ERASE
+    CMD_CHIP_ERASE = _CMD_CHIP_ERASE
     
     # Status Register Bits
-    STATUS_WIP = 0x01  # Write In Progress
-    STATUS_WEL = 0x02  # Write Enable Latch
+    STATUS_WIP = _STATUS_WIP  # Write In Progress
+    STATUS_WEL = _STATUS_WEL  # Write Enable Latch
 
 
     def __init__(self, bus: int = 0, device: int = 0):
@@ -53,10 +118,19 @@ class ChipInfo:
          # Assign bus and device to SPI controller
         self.bus = bus
         self.device = device
-        self.spi = None # Placeholder for the SPI device interface
+        self.spi: Optional['spidev.SpiDev'] = None # Placeholder for the SPI device interface
         self.chip_info = None # Placeholder for detected chip info once connected
         self._is_connected = False # Track connection status to avoid blind operations
-        self._buffer_size = 4096  #Buffer size: selected for speed vs memory balance for nowww
+        self._bufsiz = 4096 # spidev per-message limit, refreshed from the module parameter on connect
+        self._buffer_size = self._bufsiz - 5  # Data bytes per chunk, leaves room for the fast read header
+        self._depth = 8 # Max chunk reads kept in flight by read_firmware
+        self._tx_pool = [] # Reused transmit buffers (header + zeros clocked out), one per in flight read
+        self._bus_ready = None # Set while the programmer and chip are answering, made per loop in _bind_loop()
+        self._reprobe_task = None # Background recovery after a failed transfer
+        self._io_pool = None # Single SPI I/O thread, keeps blocking ioctls off the event loop and in order
+        self._bulk = None # Direct ioctl reader, None when we have to go through py-spidev
+        self._run_io = None # run_in_executor bound to the running loop and _io_pool, see _bind_loop()
+        self._loop = None # Loop the above were made for
         logger.info(f"Initializing SPI Controller on bus {bus}, device {device}")
 
 
@@ -65,6 +139,23 @@ class ChipInfo:
         if not self._is_connected or not self.spi:
             raise ConnectionError("SPI device not connected. Call connect() first.")
 
+    def _configure(self) -> None:
+        """Apply our bus settings to the freshly opened spidev device"""
+        # Optimize SPI settings for maximum reliability
+        self.spi.max_speed_hz = 10000000  # 10MHz - Will auto-negotiate down if needed
+        self.spi.mode = 0 # SPI mode 0 (CPOL=0, CPHA=0)
+        self.spi.bits_per_word = 8
+        self.spi.lsbfirst = False
+
+    def _reset_bus(self) -> None:
+        """Reopen the spidev device after a bus level (EIO) failure"""
+        logger.warning("SPI bus error, reopening device")
+        self.spi.close()
+        self.spi.open(self.bus, self.device)
+        self._configure()
+        if self._bulk:
+            self._bulk.fd = self.spi.fileno() # New descriptor after reopening
+
     async def connect(self) -> bool:
         """
         Establish connection to SPI device with advanced setup
@@ -72,22 +163,42 @@ class ChipInfo:
         """
         try:
             import spidev # Local import only load this if actually trying to connect
+            if self._io_pool is None:
+                self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='spi-io')
             self.spi = spidev.SpiDev()
             self.spi.open(self.bus, self.device)
+            self._configure()
+            self._bind_loop()
+
+            # Size chunks to the largest message spidev accepts, fast read auto-increments
+            # the address so one transaction can cover the whole buffer
+            try:
+                with open('/sys/module/spidev/parameters/bufsiz') as f:
+                    self._bufsiz = int(f.read())
+            except (OSError, ValueError):
+                self._bufsiz = 4096 # Kernel default
+            self._buffer_size = self._bufsiz - 5
+            try:
+                from .bulk_reader import BulkReader # Linux only (fcntl)
+                self._bulk = BulkReader(self.spi.fileno(), self._buffer_size)
+                self._tx_pool = [] # Bulk reads carry their own header, no tx buffers needed
+            except (ImportError, AttributeError, OSError) as e:
+                # Older py-spidev without fileno() or no fcntl, spidev transfers still work
+                logger.debug(f"Direct SPI reads unavailable: {str(e)}")
+                self._bulk = None
+                # xfer2 caps each message below the kernel bufsiz, chunks have to fit that instead
+                message_size = min(self._bufsiz, _SPIDEV_MAX_XFER)
+                self._buffer_size = message_size - 5
+                self._tx_pool = [bytearray(message_size) for _ in range(self._depth)]
             
-            # Optimize SPI settings for maximum reliability
-            self.spi.max_speed_hz = 10000000  # 10MHz - Will auto-negotiate down if needed
-            self.spi.mode = 0 # SPI mode 0 (CPOL=0, CPHA=0)
-            self.spi.bits_per_word = 8
-            self.spi.lsbfirst = False
-            
-            # Verify connection with test command
-            if self._test_connection():
+            # Verify connection with a JEDEC ID read, the same answer identifies the chip
+            response = await self._read_id()
+            if response is not None:
                 self._is_connected = True
                 logger.success("SPI connection established successfully")
                 
                 # Auto detect connected chip
-                self.chip_info = self._detect_chip()
+                self.chip_info = self._decode_chip(response)
                 if self.chip_info:
                     logger.info(f"Detected: {self.chip_info}")
                 return True
@@ -101,63 +212,70 @@ class ChipInfo:
             logger.error(f"Failed to initialize SPI: {str(e)}")
             return False
 
-    def _test_connection(self) -> bool:
-        """Verify SPI communication with test commands"""
+    def _bind_loop(self) -> None:
+        """Cache the executor submit call for the running loop, saves the lookups on every transfer"""
+        loop = asyncio.get_running_loop()
+        self._run_io = functools.partial(loop.run_in_executor, self._io_pool)
+        if loop is not self._loop:
+            # Events and tasks belong to one loop, start fresh on a new one
+            self._loop = loop
+            self._bus_ready = asyncio.Event()
+            self._bus_ready.set()
+            self._reprobe_task = None
+
+    def _io(self, fn, *args) -> asyncio.Future:
+        """Run a blocking spidev call on the SPI I/O thread, await the returned future"""
+        return self._run_io(fn, *args)
+
+    def _xfer(self, tx) -> asyncio.Future:
+        """Full duplex transfer with CS held low for the whole message, await the returned future"""
+        return self._io(self.spi.xfer2, tx)
+
+    async def _read_id(self) -> Optional[bytes]:
+        """
+        Read the JEDEC ID, doubles as the connection test
+        Returns the 3 ID bytes or None if the chip didn't answer
+        """
         try:
-            # Read JEDEC ID as connection test
-            self.spi.xfer([self.CMD_READ_ID])
-            response = self.spi.readbytes(3) # Should be exactly 3 bytes
-            return len(response) == 3 
+            # Send JEDEC ID command, the 3 ID bytes come back after the command byte
+            response = await self._xfer([_CMD_READ_ID, 0, 0, 0])
+            if len(response) == 4:
+                return bytes(response[1:])
+            return None
         except Exception:
             # baddd
-            return False
+            return None
 
-    def _detect_chip(self) -> Optional[ChipInfo]:
+    def _decode_chip(self, response: bytes) -> Optional[ChipInfo]:
         """
-        Detect and identify connected flash chip
-        Returns ChipInfo object or None if detection fails
+        Identify the connected flash chip from its JEDEC ID bytes
+        Returns ChipInfo object or None if the chip is unknown
         """
-        try:
-            # Send JEDEC ID command
-            self.spi.xfer([self.CMD_READ_ID])
-            response = self.spi.readbytes(3)
-            
+        # Lookup chip details straight from the raw ID bytes
+        info = _CHIP_TABLE.get(response)
+        if info:
+            # Return populated ChipInfo if the chip is recognized.
+            size_mb, page_size, sector_size = info
             manufacturer_id = response[0]
             device_id = (response[1] << 8) | response[2]
-            
-            # Lookup chip details (will expandd)
-            chip_sizes = {
-                0xEF4016: (2, 256, 4096),    # W25Q16 (2MB)
-                0xEF4017: (4, 256, 4096),    # W25Q32 (4MB)
-                0xEF4018: (8, 256, 4096),    # W25Q64 (8MB)
-                0xEF4019: (16, 256, 4096),   # W25Q128 (16MB)
-            }
-            # Unique identifier for each chip.
-            chip_id = (manufacturer_id << 16) | device_id
-            if chip_id in chip_sizes:
-                # Return populated ChipInfo if the chip is recognized.
-                size_mb, page_size, sector_size = chip_sizes[chip_id]
-                return ChipInfo(manufacturer_id, device_id, size_mb, page_size, sector_size)
-                # sorry cannot find
-            logger.warning(f"Unknown chip ID: 0x{chip_id:06X}")
-            return None
-            
-        except Exception as e:
-            logger.error(f"Chip detection failed: {str(e)}")
-            return None
+            return ChipInfo(manufacturer_id, device_id, size_mb, page_size, sector_size)
+            # sorry cannot find
+        logger.warning(f"Unknown chip ID: 0x{response.hex().upper()}")
+        return None
 
-    async def read_firmware(self, start_address: int = 0, length: Optional[int] = None) -> Optional[bytes]:
+    async def read_firmware(self, start_address: int = 0, length: Optional[int] = None) -> Optional[ReadResult]:
         """
-        Read firmware data with error handling and progress monitoring
+        Read firmware data with error handling, progress monitoring and a SHA-256 digest
         
         Args:
             start_address: Starting address to read from
             length: Number of bytes to read (None = entire chip)
             
         Returns:
-            bytes containing the read data or None if failed
+            ReadResult with the data and its SHA-256, or None if failed
         """
         self._verify_connection()
+        self._bind_loop() # We may be on a different loop than connect() ran on
         
         try:
             if not length and self.chip_info:
@@ -166,63 +284,186 @@ class ChipInfo:
                  # No chip size available and no length provided; problem
                 raise ValueError("Must specify length if chip size unknown")
                 
-            data = bytearray() # Buffer for the data we read.
-            address = start_address
-            remaining = length
-            
-            # Monitor progress as we read
-            with logger.progress("Reading firmware...") as progress:
+            data = bytearray(length) # Buffer for the data we read, filled in place by each chunk
+            view = memoryview(data)
+            digest = hashlib.sha256() # Fed in address order while the chunks are still hot
+            checksum = google_crc32c.Checksum() if google_crc32c else None
+            sector_crcs = {}
+            crc_from = start_address # First address not yet covered by sector_crcs
+            stop = start_address + length
+            pending = asyncio.Queue() # Submitted reads, in address order
+            slots = asyncio.Semaphore(self._depth) # Caps how many reads are in flight
+
+            async def submit() -> None:
+                # Keep the window topped up so the next transfers are queued while we consume
+                address = start_address
+                remaining = length
                 while remaining > 0:
-                    # Read a chunk of data each time
                     chunk_size = min(remaining, self._buffer_size)
-                    chunk = await self._read_chunk(address, chunk_size)
-                    if not chunk:
-                        raise IOError(f"Failed to read at address 0x{address:06X}")
-                        
-                    data.extend(chunk)
+                    await slots.acquire()
+                    out = view[address - start_address:address - start_address + chunk_size]
+                    read = asyncio.ensure_future(self._read_chunk(address, out))
+                    await pending.put((address, out, read))
                     address += chunk_size
                     remaining -= chunk_size
-                    
-                    # Update progress
-                    progress.update(f"Read {len(data)}/{length} bytes")
+                await pending.put(None) # Nothing left to submit
+
+            producer = asyncio.ensure_future(submit())
+            try:
+                done = 0
+                # Monitor progress as we read, throttled so logging stays off the hot path
+                logger.info("Reading firmware...")
+                now = time.monotonic
+                next_update = 0.0
+                while True:
+                    item = await pending.get()
+                    if item is None:
+                        break
+                    address, out, read = item
+                    ok = await read
+                    slots.release()
+                    if not ok:
+                        raise IOError(f"Failed to read at address 0x{address:06X}")
+                    digest.update(out)
+                    if checksum:
+                        checksum.update(bytes(out)) # google-crc32c only takes bytes, not views
+                        # CRC each sector once it's complete, keys don't depend on the transfer size
+                        end = address + len(out)
+                        while crc_from < end:
+                            sector_end = min((crc_from // _CRC_SECTOR + 1) * _CRC_SECTOR, stop)
+                            if sector_end > end:
+                                break # Rest of this sector is still in flight
+                            sector = bytes(view[crc_from - start_address:sector_end - start_address])
+                            sector_crcs[crc_from] = google_crc32c.value(sector)
+                            crc_from = sector_end
+                    done += len(out)
+
+                    # Update progress at most every 100ms, loguru only formats if a sink wants it
+                    t = now()
+                    if t >= next_update:
+                        logger.info("Read {}/{} bytes", done, length)
+                        next_update = t + 0.1
+            finally:
+                # Don't leave reads running behind us on failure
+                producer.cancel()
+                while not pending.empty():
+                    item = pending.get_nowait()
+                    if item is not None:
+                        item[2].cancel()
                     
             logger.success(f"Successfully read {len(data)} bytes of firmware")
-            return bytes(data)
+            result = ReadResult(data, digest.digest(),
+                                int.from_bytes(checksum.digest(), 'big') if checksum else None, sector_crcs)
+            logger.info(f"SHA-256: {digest.hexdigest()}")
+            if checksum:
+                logger.info(f"CRC32C: 0x{result.crc32c:08X}")
+            return result
             
         except Exception as e:
             # badd see log
             logger.error(f"Firmware read failed: {str(e)}")
             return None
 
-    async def _read_chunk(self, address: int, length: int) -> Optional[bytes]:
-        """Read a chunk of data with retries and verification"""
-        for attempt in range(3):  # 3 retries
+    async def _read_chunk(self, address: int, out: memoryview) -> bool:
+        """Read len(out) bytes at address straight into out, with retries and verification"""
+        failures = 0 # 3 retries
+        checks = 0 # Verify re-reads after a failure, budgeted separately so a clean read isn't wasted
+        last_crc = None # CRC of the last clean read once the bus has misbehaved
+        while failures < 3 and checks < 3:
             try:
-                # Fast read command with address
-                cmd = [
-                    self.CMD_FAST_READ,
-                    (address >> 16) & 0xFF,
-                    (address >> 8) & 0xFF,
-                    address & 0xFF,
-                    0  # Dummy byte for fast read
-                ]
-                # Send command and read response
-                self.spi.xfer(cmd)
-                data = self.spi.readbytes(length)
-                 # Ensuring we got the expected amount of data
-                if len(data) == length:
-                    return bytes(data)
-                    
+                if self._bulk:
+                    # Straight ioctl on the spidev fd, no list round trip through py-spidev
+                    await self._io(self._bulk.read, address, out)
+                elif not await self._spidev_read(address, out):
+                    failures += 1
+                    continue
+                if failures == 0:
+                    return True
+                # The bus just misbehaved, only trust data that reads back the same twice
+                crc = _chunk_crc(bytes(out))
+                if crc == last_crc:
+                    return True
+                last_crc = crc
+                checks += 1
+
             except Exception as e:
-                logger.warning(f"Read attempt {attempt + 1} failed: {str(e)}")
-                await asyncio.sleep(0.1)  # Short delay before retry
+                failures += 1
+                logger.warning(f"Read attempt {failures} failed: {str(e)}")
+                code = e.errno if isinstance(e, OSError) else None
+                if code == errno.ETIMEDOUT:
+                    continue # Transfer just timed out, nothing to recover
+                # Hold reads until recovery finishes, resume the moment the bus answers
+                self._bus_ready.clear()
+                if self._reprobe_task is None or self._reprobe_task.done():
+                    self._reprobe_task = asyncio.ensure_future(self._reprobe(reset=code == errno.EIO))
+                await asyncio.shield(self._reprobe_task) # Shielded, other reads wait on the same probe
+                if not self._bus_ready.is_set():
+                    return False # Recovery gave up, retrying a dead bus won't help
                 
-        return None
+        return False
+
+    async def _spidev_read(self, address: int, out: memoryview) -> bool:
+        """Fast read through py-spidev transfers, used when direct ioctls aren't available"""
+        length = len(out)
+        # Each queued read needs its own tx buffer until the I/O thread gets to it. read_firmware keeps
+        # at most _depth reads in flight, and connect() sizes chunks so header + data fit one xfer2
+        # message (the smaller of bufsiz and py-spidev's 4096 byte limit)
+        tx = self._tx_pool.pop()
+        try:
+            # Fast read command with address, dummy byte, then clock out the data.
+            # One transfer keeps CS low for the whole command + data phase.
+            _HDR_STRUCT.pack_into(tx, 0, _CMD_FAST_READ, (address & 0xFFFFFF) << 8)
+            msg = memoryview(tx)[:5 + length] if 5 + length < len(tx) else tx # Short tail chunk
+            rx = await self._xfer(msg)
+             # Ensuring we got the expected amount of data
+            if len(rx) == 5 + length:
+                out[:] = bytes(rx[5:])
+                return True
+            return False
+        finally:
+            self._tx_pool.append(tx)
+
+    async def _reprobe(self, reset: bool = False) -> None:
+        """Re-test the bus after a failure and release waiting reads once it answers"""
+        try:
+            if reset:
+                await self._io(self._reset_bus)
+            for attempt in range(8):
+                if await self._read_id() is not None and await self._wait_ready():
+                    self._bus_ready.set()
+                    return
+                # Exponential backoff with jitter between probes
+                await asyncio.sleep(0.001 * (1 << attempt) + random.random() * 0.0005)
+            logger.error("SPI bus did not recover")
+        except Exception as e:
+            logger.error(f"SPI bus recovery failed: {str(e)}")
+
+    async def _wait_ready(self, timeout_ms: int = 50) -> bool:
+        """Poll the status register until the chip clears WIP, False on timeout or bus error"""
+        deadline = time.monotonic() + timeout_ms / 1000
+        try:
+            while True:
+                status = await self._xfer([_CMD_READ_STATUS, 0])
+                if status[1] & _STATUS_WIP == 0:
+                    return True
+                if time.monotonic() >= deadline:
+                    return False
+                await asyncio.sleep(0) # Let other reads make progress between polls
+        except Exception:
+            return False
 
     def close(self) -> None:
         """Clean up resources and close connection"""
+        if self._reprobe_task:
+            self._reprobe_task.cancel()
+        if self._io_pool:
+            # Let queued transfers finish before the device goes away
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
         if self.spi:
             self.spi.close()
             self._is_connected = False
             logger.info("SPI connection closed")
 
+
+__all__ = ['ChipInfo', 'ReadResult', 'SPIController']